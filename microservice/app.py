@@ -1,16 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import orjson
 import uvicorn
+from anyio import to_thread
 import os
 from model_handler import SupplierRecommender
 
+# Inicializar el sistema de recomendación
+recommender = None
+products_payload = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global recommender, products_payload
+    # Más hilos para los handlers síncronos (por defecto anyio usa 40)
+    to_thread.current_default_thread_limiter().total_tokens = 64
+    try:
+        recommender = SupplierRecommender()
+        
+        # Los productos no cambian mientras corre el servicio: serializar una vez
+        products = recommender.get_available_products()
+        products_payload = orjson.dumps({
+            "filtration_products": products["filtration"],
+            "sensor_products": products["sensors"],
+            "total_products": len(products["filtration"]) + len(products["sensors"])
+        })
+        
+        # Calentar el modelo (compilación numba, cachés) antes de la primera petición
+        warmup_product = (products["filtration"] + products["sensors"])[0]
+        recommender.recommend_suppliers(warmup_product, "Low", 1, 1000.0)
+        print("✅ Sistema de recomendación cargado correctamente")
+    except Exception as e:
+        print(f"❌ Error al cargar sistema: {e}")
+        raise e
+    yield
+
 # Inicializar FastAPI
 app = FastAPI(
     title="Dewatering Solutions - Supplier Recommender API",
     description="Sistema de recomendación de proveedores basado en árboles de decisión",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -22,18 +58,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar el sistema de recomendación
-recommender = None
-
-@app.on_event("startup")
-async def startup_event():
-    global recommender
-    try:
-        recommender = SupplierRecommender()
-        print("✅ Sistema de recomendación cargado correctamente")
-    except Exception as e:
-        print(f"❌ Error al cargar sistema: {e}")
-        raise e
+# Comprimir respuestas grandes (listas de recomendaciones)
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
 
 # Modelos Pydantic para requests/responses
 class RecommendationRequest(BaseModel):
@@ -54,6 +80,8 @@ class SupplierRecommendation(BaseModel):
     final_score: float
     recommendation_level: str
     within_budget: bool
+    shipping_included: bool
+    express_available: bool
 
 class RecommendationResponse(BaseModel):
     product_type: str
@@ -65,14 +93,17 @@ class RecommendationResponse(BaseModel):
 
 # ENDPOINTS
 
+# Respuestas constantes, serializadas una sola vez al importar el módulo
+ROOT_PAYLOAD = orjson.dumps({
+    "message": "Dewatering Solutions - Supplier Recommender API",
+    "version": "1.0.0",
+    "status": "running",
+    "author": "Dewatering Solutions Team"
+})
+
 @app.get("/")
 async def root():
-    return {
-        "message": "Dewatering Solutions - Supplier Recommender API",
-        "version": "1.0.0",
-        "status": "running",
-        "author": "Dewatering Solutions Team"
-    }
+    return Response(content=ROOT_PAYLOAD, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
@@ -84,19 +115,15 @@ async def get_available_products():
     if not recommender:
         raise HTTPException(status_code=500, detail="Sistema no inicializado")
     
-    try:
-        products = recommender.get_available_products()
-        return {
-            "filtration_products": products["filtration"],
-            "sensor_products": products["sensors"],
-            "total_products": len(products["filtration"]) + len(products["sensors"])
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo productos: {str(e)}")
+    return Response(content=products_payload, media_type="application/json")
 
-@app.post("/recommend", response_model=RecommendationResponse)
-async def recommend_suppliers(request: RecommendationRequest):
+# El esquema solo se documenta: el recomendador ya devuelve tipos nativos,
+# así que no se vuelve a validar la respuesta en cada llamada
+@app.post("/recommend", responses={200: {"model": RecommendationResponse}})
+def recommend_suppliers(request: RecommendationRequest):
     """Obtener recomendaciones de proveedores"""
+    # Handler síncrono: FastAPI lo ejecuta en el threadpool y la inferencia
+    # (pandas/numpy) no bloquea el event loop
     if not recommender:
         raise HTTPException(status_code=500, detail="Sistema no inicializado")
     
@@ -131,40 +158,51 @@ async def recommend_suppliers(request: RecommendationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en recomendación: {str(e)}")
 
+# Escenarios de prueba predefinidos (constantes)
+TEST_SCENARIOS_PAYLOAD = orjson.dumps({"test_scenarios": [
+    {
+        "name": "Rollos Premium vs Económicos",
+        "params": {
+            "product_type": "filter_cloth_roll",
+            "urgency": "Low",
+            "quantity": 2,
+            "budget": 8000
+        }
+    },
+    {
+        "name": "Filtros Prensa Estándar", 
+        "params": {
+            "product_type": "filter_press_cloth_set",
+            "urgency": "Medium",
+            "quantity": 30,
+            "budget": 800
+        }
+    },
+    {
+        "name": "Válvulas Urgentes",
+        "params": {
+            "product_type": "valve_butterfly",
+            "urgency": "Critical",
+            "quantity": 1,
+            "budget": 600
+        }
+    }
+]})
+
 @app.get("/test-scenarios")
 async def get_test_scenarios():
     """Obtener escenarios de prueba predefinidos"""
-    scenarios = [
-        {
-            "name": "Rollos Premium vs Económicos",
-            "params": {
-                "product_type": "filter_cloth_roll",
-                "urgency": "Low",
-                "quantity": 2,
-                "budget": 8000
-            }
-        },
-        {
-            "name": "Filtros Prensa Estándar", 
-            "params": {
-                "product_type": "filter_press_cloth_set",
-                "urgency": "Medium",
-                "quantity": 30,
-                "budget": 800
-            }
-        },
-        {
-            "name": "Válvulas Urgentes",
-            "params": {
-                "product_type": "valve_butterfly",
-                "urgency": "Critical",
-                "quantity": 1,
-                "budget": 600
-            }
-        }
-    ]
-    return {"test_scenarios": scenarios}
+    return Response(content=TEST_SCENARIOS_PAYLOAD, media_type="application/json")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    workers = int(os.environ.get("WORKERS", os.cpu_count() or 1))
+    # Con workers > 1 uvicorn necesita la app como "modulo:atributo"
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=workers
+    )
\ No newline at end of file
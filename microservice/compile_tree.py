@@ -0,0 +1,48 @@
+# COMPILAR EL ÁRBOL DE DECISIÓN A C
+# Genera models/tree_predictor.so a partir del modelo entrenado.
+# model_handler.py lo usa si existe; si no, recorre el árbol con numba/sklearn.
+
+import joblib
+import m2cgen
+import os
+import subprocess
+
+MODEL_PATH = 'models/decision_tree_model_fixed.pkl'
+SOURCE_PATH = 'models/tree_predictor.c'
+LIBRARY_PATH = 'models/tree_predictor.so'
+
+# Envoltorio por lotes: una llamada para todas las filas de la matriz float32
+BATCH_WRAPPER = """
+void score_batch(const float * X, int n_rows, int n_features, double * out) {{
+    double row[{n_features}];
+    for (int i = 0; i < n_rows; i++) {{
+        for (int j = 0; j < n_features; j++) {{
+            row[j] = X[i * n_features + j];
+        }}
+        score(row, out + i * {n_classes});
+    }}
+}}
+"""
+
+
+def compile_tree():
+    """Exportar el árbol a C con m2cgen y compilarlo como librería compartida"""
+    model = joblib.load(MODEL_PATH)
+
+    code = m2cgen.export_to_c(model)
+    code += BATCH_WRAPPER.format(n_features=model.n_features_in_, n_classes=len(model.classes_))
+
+    with open(SOURCE_PATH, 'w') as f:
+        f.write(code)
+
+    subprocess.run(
+        ['gcc', '-O3', '-shared', '-fPIC', '-o', LIBRARY_PATH, SOURCE_PATH],
+        check=True
+    )
+    os.remove(SOURCE_PATH)
+
+    print(f"✅ Árbol compilado en {LIBRARY_PATH}")
+
+
+if __name__ == "__main__":
+    compile_tree()
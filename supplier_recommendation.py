@@ -8,13 +8,66 @@ from datetime import datetime
 import os
 import sys
 
+# Columnas del dataset que usa el recomendador (el resto no se carga)
+REQUIRED_COLS = ['product_type', 'supplier_name', 'country', 'quality_rating', 'price_usd',
+                 'delivery_days', 'payment_terms_days', 'shipping_included',
+                 'express_available', 'incoterms']
+
+# Texto como category (filtros y groupby sobre códigos enteros) y enteros pequeños
+COLUMN_DTYPES = {
+    'product_type': 'category',
+    'supplier_name': 'category',
+    'country': 'category',
+    'incoterms': 'category',
+    'delivery_days': np.int16,
+    'payment_terms_days': np.int16,
+    'shipping_included': bool,
+    'express_available': bool
+}
+
+# Niveles de recomendación según el score final (umbrales: >= 0.45, 0.6, 0.75)
+RECOMMENDATION_LEVELS = np.array([
+    "❌ No Recomendado", "⭐ Aceptable", "⭐⭐ Recomendado", "⭐⭐⭐ Altamente Recomendado"
+])
+LEVEL_THRESHOLDS = np.array([0.45, 0.6, 0.75])
+
+try:
+    from numba import njit
+except ImportError:  # numba es opcional; sin él se recorre el árbol con sklearn
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _apply_tree(X, feature, threshold, children_left, children_right):
+        """Índice de la hoja alcanzada por cada fila de X"""
+        leaves = np.empty(X.shape[0], dtype=np.intp)
+        for i in range(X.shape[0]):
+            node = 0
+            while children_left[node] != -1:
+                if X[i, feature[node]] <= threshold[node]:
+                    node = children_left[node]
+                else:
+                    node = children_right[node]
+            leaves[i] = node
+        return leaves
+else:
+    _apply_tree = None
+
 class SupplierRecommender:
     def __init__(self):
         self.model = None
+        self._tree_arrays = None
+        self._leaf_proba = None
         self.label_encoders = None
+        self._encoder_maps = None
         self.target_encoder = None
+        self._supplier_to_class_idx = None
         self.feature_names = None
+        self._feature_index = None
         self.df = None
+        self._by_product = None
+        self._incoterm_codes = None
+        self._available_products = None
         self.load_system()
     
     def load_system(self):
@@ -23,11 +76,39 @@ class SupplierRecommender:
             # Cargar modelo corregido
             self.model = joblib.load('models/decision_tree_model_fixed.pkl')
             self.label_encoders = joblib.load('models/label_encoders_fixed.pkl')
+            self._encoder_maps = {
+                feat: dict(zip(le.classes_, range(len(le.classes_))))
+                for feat, le in self.label_encoders.items()
+            }
             self.target_encoder = joblib.load('models/target_encoder_fixed.pkl')
+            self._supplier_to_class_idx = {c: i for i, c in enumerate(self.target_encoder.classes_)}
             self.feature_names = joblib.load('models/feature_names_fixed.pkl')
+            self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
+            
+            # Árbol como arrays planos; cada nodo guarda sus probabilidades ya normalizadas
+            tree = self.model.tree_
+            self._tree_arrays = (tree.feature, tree.threshold, tree.children_left, tree.children_right)
+            node_values = tree.value[:, 0, :]
+            self._leaf_proba = node_values / node_values.sum(axis=1, keepdims=True)
             
             # Cargar dataset
-            self.df = pd.read_csv('data/dewatering_realistic_supplier_dataset.csv')
+            self.df = pd.read_csv('data/dewatering_realistic_supplier_dataset.csv',
+                                  usecols=REQUIRED_COLS, dtype=COLUMN_DTYPES)
+            
+            # Tabla de proveedores por tipo de producto (un registro por proveedor)
+            self._by_product = {
+                pt: sub.drop_duplicates('supplier_name').set_index('supplier_name')
+                for pt, sub in self.df.groupby('product_type', observed=True)
+            }
+            
+            # Incoterms ya codificados por producto (categorías desconocidas -> 0)
+            incoterm_map = self._encoder_maps['incoterms']
+            self._incoterm_codes = {
+                pt: sub['incoterms'].map(incoterm_map).astype(np.float32).fillna(0).to_numpy()
+                for pt, sub in self._by_product.items()
+            }
+            
+            self._available_products = self._build_available_products()
             
             print("✅ Sistema cargado correctamente")
             
@@ -39,6 +120,10 @@ class SupplierRecommender:
     
     def get_available_products(self):
         """Obtener productos disponibles organizados por categoría"""
+        return self._available_products
+    
+    def _build_available_products(self):
+        """Clasificar los productos del dataset por categoría"""
         products = self.df['product_type'].unique()
         
         # Separar por categoría
@@ -73,7 +158,7 @@ class SupplierRecommender:
         print("\n🔧 PRODUCTOS DE FILTRACIÓN:")
         for product in products['filtration']:
             # Mostrar productos con proveedores disponibles
-            suppliers = self.df[self.df['product_type'] == product]['supplier_name'].unique()
+            suppliers = self._by_product[product].index
             print(f"{option_num:2d}. {product}")
             print(f"    Proveedores: {', '.join(suppliers)}")
             product_map[option_num] = product
@@ -81,7 +166,7 @@ class SupplierRecommender:
         
         print("\n⚡ PRODUCTOS DE SENSORES:")
         for product in products['sensors']:
-            suppliers = self.df[self.df['product_type'] == product]['supplier_name'].unique()
+            suppliers = self._by_product[product].index
             print(f"{option_num:2d}. {product}")
             print(f"    Proveedores: {', '.join(suppliers)}")
             product_map[option_num] = product
@@ -156,6 +241,14 @@ class SupplierRecommender:
         
         return selected_product, selected_urgency, quantity, budget
     
+    def _predict_proba(self, X):
+        """Probabilidades por clase para X (float32 contiguo, columnas según feature_names)"""
+        if _apply_tree is not None:
+            leaves = _apply_tree(X, *self._tree_arrays)
+        else:
+            leaves = self.model.tree_.apply(X)
+        return self._leaf_proba[leaves]
+    
     def recommend_suppliers(self, product_type, urgency, quantity, budget):
         """Función de recomendación (copiada del notebook)"""
         # Validar inputs
@@ -163,104 +256,91 @@ class SupplierRecommender:
         if urgency not in valid_urgencies:
             return {"error": f"Urgencia debe ser una de: {valid_urgencies}"}
         
-        # Obtener productos disponibles del tipo solicitado
-        available_products = self.df[self.df['product_type'] == product_type]
-        if available_products.empty:
+        # Obtener proveedores del tipo solicitado
+        suppliers = self._by_product.get(product_type)
+        if suppliers is None:
             available_types = self.df['product_type'].unique()
             return {"error": f"Producto no encontrado. Tipos disponibles: {list(available_types)}"}
         
         # Generar recomendaciones para cada proveedor que ofrece el producto
-        recommendations = []
+        month = datetime.now().month
+        quarter = f"Q{(month-1)//3 + 1}"
         
-        for supplier_name in available_products['supplier_name'].unique():
-            supplier_data = available_products[available_products['supplier_name'] == supplier_name].iloc[0]
-            
-            # FEATURES LIMPIAS (sin country/quality_rating)
-            input_data = pd.DataFrame({
-                'price_usd': [supplier_data['price_usd']],
-                'delivery_days': [supplier_data['delivery_days']],
-                'payment_terms_days': [supplier_data['payment_terms_days']],
-                'shipping_included': [int(supplier_data['shipping_included'])],
-                'express_available': [int(supplier_data['express_available'])],
-                'order_urgency': [urgency],
-                'quantity_needed': [quantity],
-                'budget_available': [budget],
-                'product_type': [product_type],
-                'incoterms': [supplier_data['incoterms']],
-                'month': [datetime.now().month],
-                'quarter': [f"Q{(datetime.now().month-1)//3 + 1}"]
-            })
-            
-            # Aplicar encoding
-            for feature in self.label_encoders.keys():
-                if feature in input_data.columns:
-                    try:
-                        input_data[feature] = self.label_encoders[feature].transform(input_data[feature].astype(str))
-                    except ValueError:
-                        input_data[feature] = 0
-            
-            # Reordenar columnas según el modelo
-            input_data = input_data[self.feature_names]
-            
-            # Obtener probabilidades de predicción
-            probabilities = self.model.predict_proba(input_data)[0]
-            supplier_idx = np.where(self.target_encoder.classes_ == supplier_name)[0]
-            
-            if len(supplier_idx) > 0:
-                probability = probabilities[supplier_idx[0]]
-            else:
-                probability = 0.0
-            
-            # Calcular costos
-            total_cost = supplier_data['price_usd'] * quantity
-            if not supplier_data['shipping_included']:
-                total_cost += 300  # Costo estimado de envío
-            
-            # Crear recomendación
-            recommendation = {
-                'supplier_name': supplier_name,
-                'country': supplier_data['country'],
-                'quality_rating': supplier_data['quality_rating'],
-                'price_usd': supplier_data['price_usd'],
-                'total_cost': round(total_cost, 2),
-                'delivery_days': supplier_data['delivery_days'],
-                'payment_terms_days': supplier_data['payment_terms_days'],
-                'probability_score': round(probability, 3),
-                'within_budget': total_cost <= budget,
-                'shipping_included': supplier_data['shipping_included'],
-                'express_available': supplier_data['express_available']
-            }
-            
-            # Calcular score final
-            quality_score = recommendation['quality_rating'] / 5.0
-            price_score = 1.0 if recommendation['within_budget'] else 0.5
-            delivery_score = 1.0 if recommendation['delivery_days'] <= 15 else 0.7
-            payment_score = 1.0 if recommendation['payment_terms_days'] > 0 else 0.8
-            
-            final_score = (
-                recommendation['probability_score'] * 0.4 +
-                quality_score * 0.25 +
-                price_score * 0.2 +
-                delivery_score * 0.1 +
-                payment_score * 0.05
-            )
-            
-            recommendation['final_score'] = round(final_score, 3)
-            
-            # Nivel de recomendación
-            if final_score >= 0.75:
-                recommendation['recommendation_level'] = "⭐⭐⭐ Altamente Recomendado"
-            elif final_score >= 0.6:
-                recommendation['recommendation_level'] = "⭐⭐ Recomendado"
-            elif final_score >= 0.45:
-                recommendation['recommendation_level'] = "⭐ Aceptable"
-            else:
-                recommendation['recommendation_level'] = "❌ No Recomendado"
-            
-            recommendations.append(recommendation)
+        # FEATURES LIMPIAS (sin country/quality_rating)
+        col = self._feature_index
+        X = np.empty((len(suppliers), len(self.feature_names)), dtype=np.float32)
+        for feature in ('price_usd', 'delivery_days', 'payment_terms_days',
+                        'shipping_included', 'express_available'):
+            X[:, col[feature]] = suppliers[feature].to_numpy(np.float32)
+        X[:, col['quantity_needed']] = quantity
+        X[:, col['budget_available']] = budget
+        X[:, col['month']] = month
+        
+        # Aplicar encoding (categorías desconocidas -> 0)
+        X[:, col['incoterms']] = self._incoterm_codes[product_type]
+        X[:, col['order_urgency']] = self._encoder_maps['order_urgency'].get(urgency, 0)
+        X[:, col['product_type']] = self._encoder_maps['product_type'].get(product_type, 0)
+        X[:, col['quarter']] = self._encoder_maps['quarter'].get(quarter, 0)
+        
+        # Obtener probabilidades de predicción (una fila por proveedor)
+        probabilities = self._predict_proba(X)
+        supplier_idx = np.array([
+            self._supplier_to_class_idx.get(name, -1) for name in suppliers.index
+        ])
+        supplier_probs = np.where(
+            supplier_idx >= 0,
+            probabilities[np.arange(len(suppliers)), supplier_idx],
+            0.0
+        )
+        
+        # Calcular costos (costo estimado de envío: 300 USD)
+        prices = suppliers['price_usd'].to_numpy()
+        total_costs = prices * quantity + np.where(suppliers['shipping_included'].to_numpy(bool), 0, 300)
+        within_budget = total_costs <= budget
+        quality_ratings = suppliers['quality_rating'].to_numpy(float)
+        delivery_days = suppliers['delivery_days'].to_numpy(int)
+        payment_terms_days = suppliers['payment_terms_days'].to_numpy(int)
+        probability_scores = np.round(supplier_probs, 3)
+        
+        # Calcular score final (vectorizado sobre todos los proveedores)
+        quality_scores = quality_ratings / 5.0
+        price_scores = np.where(within_budget, 1.0, 0.5)
+        delivery_scores = np.where(delivery_days <= 15, 1.0, 0.7)
+        payment_scores = np.where(payment_terms_days > 0, 1.0, 0.8)
+        
+        final_scores = (
+            probability_scores * 0.4 +
+            quality_scores * 0.25 +
+            price_scores * 0.2 +
+            delivery_scores * 0.1 +
+            payment_scores * 0.05
+        )
+        rounded_scores = np.round(final_scores, 3)
+        
+        # Nivel de recomendación
+        levels = RECOMMENDATION_LEVELS[np.digitize(final_scores, LEVEL_THRESHOLDS)]
+        
+        # Crear recomendaciones (valores nativos vía tolist)
+        columns = {
+            'supplier_name': suppliers.index.tolist(),
+            'country': suppliers['country'].tolist(),
+            'quality_rating': quality_ratings.tolist(),
+            'price_usd': prices.astype(float).tolist(),
+            'total_cost': np.round(total_costs, 2).tolist(),
+            'delivery_days': delivery_days.tolist(),
+            'payment_terms_days': payment_terms_days.tolist(),
+            'probability_score': probability_scores.tolist(),
+            'within_budget': within_budget.tolist(),
+            'shipping_included': suppliers['shipping_included'].to_numpy(bool).tolist(),
+            'express_available': suppliers['express_available'].to_numpy(bool).tolist(),
+            'final_score': rounded_scores.tolist(),
+            'recommendation_level': levels.tolist()
+        }
+        rows = list(zip(*columns.values()))
         
-        # Ordenar por score final
-        recommendations.sort(key=lambda x: x['final_score'], reverse=True)
+        # Ordenar por score final (estable, igual que list.sort)
+        order = np.argsort(-rounded_scores, kind='stable')
+        recommendations = [dict(zip(columns, rows[i])) for i in order]
         
         return {
             'product_type': product_type,